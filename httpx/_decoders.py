@@ -4,6 +4,7 @@ Handlers for Content-Encoding.
 See: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Content-Encoding
 """
 import codecs
+import struct
 import typing
 import zlib
 
@@ -13,6 +14,24 @@ try:
     import brotli
 except ImportError:  # pragma: nocover
     brotli = None
+else:
+    # 'brotlipy' uses the same import name, but has a different API.
+    if not hasattr(brotli.Decompressor, "process"):  # pragma: nocover
+        brotli = None
+
+try:
+    import cchardet
+except ImportError:  # pragma: nocover
+    cchardet = None
+
+try:
+    import charset_normalizer
+except ImportError:  # pragma: nocover
+    charset_normalizer = None  # type: ignore
+
+
+# Reads a big-endian 16 bit integer, as used for the zlib header check.
+_unpack_uint16 = struct.Struct(">H").unpack_from
 
 
 class ContentDecoder:
@@ -44,9 +63,26 @@ class DeflateDecoder(ContentDecoder):
 
     def __init__(self) -> None:
         self.first_attempt = True
-        self.decompressor = zlib.decompressobj()
+        self.decompressor: typing.Any = None
+        # Holds a first chunk that is too short to check for a zlib header.
+        self.header = b""
 
     def decode(self, data: bytes) -> bytes:
+        if self.decompressor is None:
+            data = self.header + data
+            if len(data) < 2:
+                self.header = data
+                return b""
+            self.header = b""
+            # Check for the two byte zlib header up front, rather than relying
+            # on a failed decompression attempt to detect raw deflate data.
+            # See RFC 1950, section 2.2.
+            if (data[0] & 0x0F) == 0x08 and _unpack_uint16(data)[0] % 31 == 0:
+                self.decompressor = zlib.decompressobj()
+            else:
+                self.first_attempt = False
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
         was_first_attempt = self.first_attempt
         self.first_attempt = False
         try:
@@ -58,6 +94,8 @@ class DeflateDecoder(ContentDecoder):
             raise ValueError(str(exc))
 
     def flush(self) -> bytes:
+        if self.decompressor is None:
+            return b""
         try:
             return self.decompressor.flush()
         except zlib.error as exc:  # pragma: nocover
@@ -72,15 +110,23 @@ class GZipDecoder(ContentDecoder):
     """
 
     def __init__(self) -> None:
-        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        # The decompressor is only created once there is data to decode, so
+        # that responses with an empty body never need to allocate one.
+        self.decompressor: typing.Any = None
 
     def decode(self, data: bytes) -> bytes:
+        if self.decompressor is None:
+            if not data:
+                return b""
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
         try:
             return self.decompressor.decompress(data)
         except zlib.error as exc:
             raise ValueError(str(exc))
 
     def flush(self) -> bytes:
+        if self.decompressor is None:
+            return b""
         try:
             return self.decompressor.flush()
         except zlib.error as exc:  # pragma: nocover
@@ -91,26 +137,20 @@ class BrotliDecoder(ContentDecoder):
     """
     Handle 'brotli' decoding.
 
-    Requires `pip install brotlipy`. See: https://brotlipy.readthedocs.io/
-        or   `pip install brotli`. See https://github.com/google/brotli
-    Supports both 'brotlipy' and 'Brotli' packages since they share an import
-    name. The top branches are for 'brotlipy' and bottom branches for 'Brotli'
+    Requires `pip install brotli`. See: https://github.com/google/brotli
     """
 
     def __init__(self) -> None:
         if brotli is None:  # pragma: nocover
             raise ImportError(
-                "Using 'BrotliDecoder', but the 'brotlipy' or 'brotli' library "
-                "is not installed."
+                "Using 'BrotliDecoder', but the 'brotli' library is not installed, "
+                "or 'brotlipy' is installed in its place. "
                 "Make sure to install httpx using `pip install httpx[brotli]`."
             ) from None
 
         self.decompressor = brotli.Decompressor()
         self.seen_data = False
-        if hasattr(self.decompressor, "decompress"):
-            self._decompress = self.decompressor.decompress
-        else:
-            self._decompress = self.decompressor.process  # pragma: nocover
+        self._decompress = self.decompressor.process
 
     def decode(self, data: bytes) -> bytes:
         if not data:
@@ -122,14 +162,11 @@ class BrotliDecoder(ContentDecoder):
             raise ValueError(str(exc))
 
     def flush(self) -> bytes:
-        if not self.seen_data:
-            return b""
-        try:
-            if hasattr(self.decompressor, "finish"):
-                self.decompressor.finish()
-            return b""
-        except brotli.error as exc:  # pragma: nocover
-            raise ValueError(str(exc))
+        # All output is returned by 'process()', so there is nothing to flush,
+        # but we do need to check that the stream was not truncated.
+        if self.seen_data and not self.decompressor.is_finished():
+            raise ValueError("Incomplete brotli stream")
+        return b""
 
 
 class MultiDecoder(ContentDecoder):
@@ -143,7 +180,7 @@ class MultiDecoder(ContentDecoder):
         each was applied.
         """
         # Note that we reverse the order for decoding.
-        self.children = list(reversed(children))
+        self.children = tuple(reversed(children))
 
     def decode(self, data: bytes) -> bytes:
         for child in self.children:
@@ -157,6 +194,22 @@ class MultiDecoder(ContentDecoder):
         return data
 
 
+def detect_encoding(content: bytes) -> typing.Optional[str]:
+    """
+    Return the encoding of 'content', as it appears to autodetection.
+    """
+    if cchardet is not None:
+        return cchardet.detect(content)["encoding"]
+    elif charset_normalizer is not None:
+        return charset_normalizer.detect(content)["encoding"]
+    return chardet.detect(content)["encoding"]
+
+
+# The amount of content that 'TextDecoder' buffers, if it needs to, while
+# determining the encoding.
+DETECTION_BUFFER_SIZE = 4096
+
+
 class TextDecoder:
     """
     Handles incrementally decoding bytes into text
@@ -166,13 +219,36 @@ class TextDecoder:
         self.decoder: typing.Optional[codecs.IncrementalDecoder] = (
             None if encoding is None else codecs.getincrementaldecoder(encoding)()
         )
-        self.detector = chardet.universaldetector.UniversalDetector()
+        # 'cchardet' and 'charset-normalizer' are fast enough to run over the
+        # whole buffered content in a single call, once we have it. Otherwise
+        # we feed chardet's detector incrementally.
+        self.detector: typing.Optional[chardet.universaldetector.UniversalDetector] = (
+            None
+            if cchardet is not None or charset_normalizer is not None
+            else chardet.universaldetector.UniversalDetector()
+        )
 
         # This buffer is only needed if 'decoder' is 'None'
         # we want to trigger errors if data is getting added to
         # our internal buffer for some silly reason while
         # a decoder is discovered.
-        self.buffer: typing.Optional[bytearray] = None if self.decoder else bytearray()
+        # It is allocated up front at the size we'll buffer up to, and
+        # 'buffer_size' tracks how much of it is in use, so that it doesn't
+        # need to be repeatedly reallocated as it fills.
+        self.buffer: typing.Optional[bytearray] = (
+            None if self.decoder else bytearray(DETECTION_BUFFER_SIZE)
+        )
+        self.buffer_size = 0
+
+        # Most text content is UTF-8, and validating that is far cheaper than
+        # running the detector. So while the encoding is unknown we first
+        # optimistically decode as UTF-8, and only feed the detector once
+        # the content turns out not to be valid UTF-8. We use 'utf-8-sig' so
+        # that a leading BOM is stripped, as it would be by the detector.
+        self.utf8_probe: typing.Optional[codecs.IncrementalDecoder] = (
+            None if self.decoder else codecs.getincrementaldecoder("utf-8-sig")()
+        )
+        self.utf8_text: typing.List[str] = []
 
     def decode(self, data: bytes) -> str:
         try:
@@ -181,19 +257,38 @@ class TextDecoder:
             else:
                 assert self.buffer is not None
                 text = ""
-                self.detector.feed(data)
-                self.buffer += data
+                end = self.buffer_size + len(data)
+                self.buffer[self.buffer_size : end] = data
+                self.buffer_size = end
+                if self.utf8_probe is not None:
+                    try:
+                        self.utf8_text.append(self.utf8_probe.decode(data))
+                    except UnicodeDecodeError:
+                        self._fallback_to_detector()
+                elif self.detector is not None:
+                    self.detector.feed(data)
 
                 # Should be more than enough data to process, we don't
                 # want to buffer too long as chardet will wait until
                 # detector.close() is used to give back common
-                # encodings like 'utf-8'.
-                if len(self.buffer) >= 4096:
-                    self.decoder = codecs.getincrementaldecoder(
-                        self._detector_result()
-                    )()
-                    text = self.decoder.decode(bytes(self.buffer), False)
+                # encodings like 'utf-8'. If the detector has already
+                # reached a confident result we can commit to it right away.
+                if self.buffer_size >= DETECTION_BUFFER_SIZE or (
+                    self.utf8_probe is None
+                    and self.detector is not None
+                    and self.detector.done
+                ):
+                    if self.utf8_probe is not None:
+                        self.decoder = self.utf8_probe
+                        text = "".join(self.utf8_text)
+                    else:
+                        self.decoder = codecs.getincrementaldecoder(
+                            self._detector_result()
+                        )()
+                        text = self._decode_buffer()
                     self.buffer = None
+                    self.utf8_probe = None
+                    self.utf8_text = []
 
             return text
         except UnicodeDecodeError as exc:  # pragma: nocover
@@ -204,17 +299,47 @@ class TextDecoder:
             if self.decoder is None:
                 # Empty string case as chardet is guaranteed to not have a guess.
                 assert self.buffer is not None
-                if len(self.buffer) == 0:
+                if self.buffer_size == 0:
                     return ""
-                return bytes(self.buffer).decode(self._detector_result())
+                if self.utf8_probe is not None:
+                    try:
+                        self.utf8_text.append(self.utf8_probe.decode(b"", True))
+                        return "".join(self.utf8_text)
+                    except UnicodeDecodeError:
+                        self._fallback_to_detector()
+                return self.buffer[: self.buffer_size].decode(self._detector_result())
 
             return self.decoder.decode(b"", True)
         except UnicodeDecodeError as exc:  # pragma: nocover
             raise ValueError(str(exc))
 
+    def _decode_buffer(self) -> str:
+        # Decode the buffered data without first copying it into 'bytes'.
+        assert self.decoder is not None
+        assert self.buffer is not None
+        try:
+            with memoryview(self.buffer)[: self.buffer_size] as view:
+                return self.decoder.decode(view, False)
+        except TypeError:  # pragma: nocover
+            # Some codecs only accept 'bytes' input.
+            return self.decoder.decode(bytes(self.buffer[: self.buffer_size]), False)
+
+    def _fallback_to_detector(self) -> None:
+        # The content is not UTF-8, so run detection over everything
+        # we've buffered so far.
+        assert self.buffer is not None
+        self.utf8_probe = None
+        self.utf8_text = []
+        if self.detector is not None:
+            self.detector.feed(bytes(self.buffer[: self.buffer_size]))
+
     def _detector_result(self) -> str:
-        self.detector.close()
-        result = self.detector.result["encoding"]
+        if self.detector is None:
+            assert self.buffer is not None
+            result = detect_encoding(bytes(memoryview(self.buffer)[: self.buffer_size]))
+        else:
+            self.detector.close()
+            result = self.detector.result["encoding"]
         if not result:  # pragma: nocover
             raise ValueError("Unable to determine encoding of content")
 
@@ -230,63 +355,82 @@ class LineDecoder:
     """
 
     def __init__(self) -> None:
-        self.buffer = ""
+        # Text for the current incomplete line. We accumulate this as a list
+        # rather than with repeated string concatenation, so that long lines
+        # spread across many chunks are only copied once.
+        self.parts: typing.List[str] = []
+        # Set if the incomplete line ended with a '\r', which has been
+        # stripped from 'parts' and could be the first half of a '\r\n' pair.
+        self.trailing_cr = False
 
     def decode(self, text: str) -> typing.List[str]:
-        lines = []
+        lines: typing.List[str] = []
 
-        if text and self.buffer and self.buffer[-1] == "\r":
+        if not text:
+            return lines
+
+        if self.trailing_cr:
+            # Handle the case where we have "\r" at the end of our previous
+            # input, or an "\r\n" split across our previous input and our
+            # new chunk.
+            self.trailing_cr = False
+            lines.append(self._take_line("") + "\n")
             if text.startswith("\n"):
-                # Handle the case where we have an "\r\n" split across
-                # our previous input, and our new chunk.
-                lines.append(self.buffer[:-1] + "\n")
-                self.buffer = ""
                 text = text[1:]
+
+        start = 0
+        newline = text.find("\n")
+        carriage = text.find("\r")
+        while newline != -1 or carriage != -1:
+            if carriage == -1 or (newline != -1 and newline < carriage):
+                lines.append(self._take_line(text[start : newline + 1]))
+                start = newline + 1
+            elif carriage == len(text) - 1:
+                # A trailing '\r' could be the first half of a '\r\n' pair that
+                # is split across our chunks, so hold it back.
+                self.parts.append(text[start:carriage])
+                self.trailing_cr = True
+                start = len(text)
+                break
+            elif newline == carriage + 1:
+                lines.append(self._take_line(text[start:carriage]) + "\n")
+                start = newline + 1
             else:
-                # Handle the case where we have "\r" at the end of our
-                # previous input.
-                lines.append(self.buffer[:-1] + "\n")
-                self.buffer = ""
-
-        while text:
-            num_chars = len(text)
-            for idx in range(num_chars):
-                char = text[idx]
-                next_char = None if idx + 1 == num_chars else text[idx + 1]
-                if char == "\n":
-                    lines.append(self.buffer + text[: idx + 1])
-                    self.buffer = ""
-                    text = text[idx + 1 :]
-                    break
-                elif char == "\r" and next_char == "\n":
-                    lines.append(self.buffer + text[:idx] + "\n")
-                    self.buffer = ""
-                    text = text[idx + 2 :]
-                    break
-                elif char == "\r" and next_char is not None:
-                    lines.append(self.buffer + text[:idx] + "\n")
-                    self.buffer = ""
-                    text = text[idx + 1 :]
-                    break
-                elif next_char is None:
-                    self.buffer += text
-                    text = ""
-                    break
+                lines.append(self._take_line(text[start:carriage]) + "\n")
+                start = carriage + 1
+
+            if newline != -1 and newline < start:
+                newline = text.find("\n", start)
+            if carriage != -1 and carriage < start:
+                carriage = text.find("\r", start)
+
+        if start < len(text):
+            self.parts.append(text[start:])
 
         return lines
 
     def flush(self) -> typing.List[str]:
-        if self.buffer.endswith("\r"):
+        if self.trailing_cr:
             # Handle the case where we had a trailing '\r', which could have
             # been a '\r\n' pair.
-            lines = [self.buffer[:-1] + "\n"]
-        elif self.buffer:
-            lines = [self.buffer]
+            lines = [self._take_line("") + "\n"]
+        elif self.parts:
+            lines = [self._take_line("")]
         else:
             lines = []
-        self.buffer = ""
+        self.trailing_cr = False
         return lines
 
+    def _take_line(self, text: str) -> str:
+        # Return any buffered text for the current line, followed by 'text',
+        # and clear the buffer.
+        if not self.parts:
+            return text
+        self.parts.append(text)
+        line = "".join(self.parts)
+        self.parts = []
+        return line
+
 
 SUPPORTED_DECODERS = {
     "identity": IdentityDecoder,
@@ -298,3 +442,28 @@ SUPPORTED_DECODERS = {
 
 if brotli is None:
     SUPPORTED_DECODERS.pop("br")  # pragma: nocover
+
+
+# 'IdentityDecoder' holds no state, so a single instance can be shared
+# between all responses that have no content encoding applied.
+_IDENTITY_DECODER = IdentityDecoder()
+
+
+def build_decoder(encodings: typing.Sequence[str]) -> ContentDecoder:
+    """
+    Return a decoder for a sequence of 'Content-Encoding' values, given in the
+    order in which each was applied.
+
+    Unsupported encodings are ignored. A `MultiDecoder` is only used if more
+    than one decoder is actually required.
+    """
+    decoders = [
+        SUPPORTED_DECODERS[encoding]()
+        for encoding in encodings
+        if encoding and encoding != "identity" and encoding in SUPPORTED_DECODERS
+    ]
+    if not decoders:
+        return _IDENTITY_DECODER
+    elif len(decoders) == 1:
+        return decoders[0]
+    return MultiDecoder(children=decoders)
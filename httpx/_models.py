@@ -10,18 +10,16 @@ from collections.abc import MutableMapping
 from http.cookiejar import Cookie, CookieJar
 from urllib.parse import parse_qsl, quote, unquote, urlencode
 
-import chardet
 import rfc3986
 import rfc3986.exceptions
 
 from ._content_streams import ByteStream, ContentStream, encode, encode_response
 from ._decoders import (
-    SUPPORTED_DECODERS,
     ContentDecoder,
-    IdentityDecoder,
     LineDecoder,
-    MultiDecoder,
     TextDecoder,
+    build_decoder,
+    detect_encoding,
 )
 from ._exceptions import (
     HTTPCORE_EXC_MAP,
@@ -801,7 +799,7 @@ class Response:
         """
         Return the encoding, as it appears to autodetection.
         """
-        return chardet.detect(self.content)["encoding"]
+        return detect_encoding(self.content)
 
     def _get_content_decoder(self) -> ContentDecoder:
         """
@@ -809,22 +807,8 @@ class Response:
         content, depending on the Content-Encoding used in the response.
         """
         if not hasattr(self, "_decoder"):
-            decoders: typing.List[ContentDecoder] = []
             values = self.headers.get_list("content-encoding", split_commas=True)
-            for value in values:
-                value = value.strip().lower()
-                try:
-                    decoder_cls = SUPPORTED_DECODERS[value]
-                    decoders.append(decoder_cls())
-                except KeyError:
-                    continue
-
-            if len(decoders) == 1:
-                self._decoder = decoders[0]
-            elif len(decoders) > 1:
-                self._decoder = MultiDecoder(children=decoders)
-            else:
-                self._decoder = IdentityDecoder()
+            self._decoder = build_decoder([value.strip().lower() for value in values])
 
         return self._decoder
 
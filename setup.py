@@ -63,7 +63,7 @@ setup(
     ],
     extras_require={
         "http2": "h2==3.*",
-        "brotli": "brotlipy==0.7.*",
+        "brotli": "brotli==1.*",
     },
     classifiers=[
         "Development Status :: 4 - Beta",
@@ -55,6 +55,30 @@ def async_environment(request: typing.Any) -> str:
     return request.param
 
 
+@pytest.fixture
+def chardet_only(monkeypatch: typing.Any) -> None:
+    """
+    Hide `cchardet` and `charset_normalizer`, so that encoding detection
+    falls back to chardet.
+    """
+    monkeypatch.setattr("httpx._decoders.cchardet", None)
+    monkeypatch.setattr("httpx._decoders.charset_normalizer", None)
+
+
+@pytest.fixture(params=["chardet", "charset_normalizer", "cchardet"])
+def encoding_detector(request: typing.Any, monkeypatch: typing.Any) -> str:
+    """
+    Run a test once with each installed encoding detector, returning the
+    name of the detector in use. Detectors that are not installed are skipped.
+    """
+    monkeypatch.setattr("httpx._decoders.cchardet", None)
+    monkeypatch.setattr("httpx._decoders.charset_normalizer", None)
+    if request.param != "chardet":
+        module = pytest.importorskip(request.param)
+        monkeypatch.setattr(f"httpx._decoders.{request.param}", module)
+    return request.param
+
+
 @pytest.fixture(scope="function", autouse=True)
 def clean_environ():
     """Keeps os.environ clean for every test without having to mock os.environ"""
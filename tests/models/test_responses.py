@@ -5,6 +5,7 @@ import brotli
 import pytest
 
 import httpx
+from tests.utils import xfail_if_misdetected
 
 
 def streaming_body():
@@ -79,10 +80,11 @@ def test_response_content_type_encoding():
     assert response.encoding == "latin-1"
 
 
-def test_response_autodetect_encoding():
+def test_response_autodetect_encoding(request, encoding_detector):
     """
     Autodetect encoding if there is no charset info in a Content-Type header.
     """
+    xfail_if_misdetected(request, encoding_detector, "EUC-JP")
     content = "おはようございます。".encode("EUC-JP")
     response = httpx.Response(
         200,
@@ -92,10 +94,11 @@ def test_response_autodetect_encoding():
     assert response.encoding == "EUC-JP"
 
 
-def test_response_fallback_to_autodetect():
+def test_response_fallback_to_autodetect(request, encoding_detector):
     """
     Fallback to autodetection if we get an invalid charset in the Content-Type header.
     """
+    xfail_if_misdetected(request, encoding_detector, "EUC-JP")
     headers = {"Content-Type": "text-plain; charset=invalid-codec-name"}
     content = "おはようございます。".encode("EUC-JP")
     response = httpx.Response(
@@ -124,6 +127,7 @@ def test_response_default_text_encoding():
     assert response.text == "Hello, world!"
 
 
+@pytest.mark.usefixtures("encoding_detector")
 def test_response_default_encoding():
     """
     Default to utf-8 if all else fails.
@@ -136,6 +140,7 @@ def test_response_default_encoding():
     assert response.encoding == "utf-8"
 
 
+@pytest.mark.usefixtures("encoding_detector")
 def test_response_non_text_encoding():
     """
     Default to apparent encoding for non-text content-type headers.
@@ -470,6 +475,7 @@ def test_json_without_specified_encoding():
     assert response.json() == data
 
 
+@pytest.mark.usefixtures("chardet_only")
 def test_json_without_specified_encoding_decode_error():
     data = {"greeting": "hello", "recipient": "world"}
     content = json.dumps(data).encode("utf-32-be")
@@ -485,6 +491,7 @@ def test_json_without_specified_encoding_decode_error():
             response.json()
 
 
+@pytest.mark.usefixtures("chardet_only")
 def test_json_without_specified_encoding_value_error():
     data = {"greeting": "hello", "recipient": "world"}
     content = json.dumps(data).encode("utf-32-be")
@@ -1,3 +1,4 @@
+import types
 import zlib
 
 import brotli
@@ -5,13 +6,18 @@ import pytest
 
 import httpx
 from httpx._decoders import (
+    _IDENTITY_DECODER,
     BrotliDecoder,
     DeflateDecoder,
     GZipDecoder,
     IdentityDecoder,
     LineDecoder,
+    MultiDecoder,
     TextDecoder,
+    build_decoder,
+    detect_encoding,
 )
+from tests.utils import xfail_if_misdetected
 
 
 def test_deflate():
@@ -51,6 +57,34 @@ def test_zlib():
     assert response.content == body
 
 
+@pytest.mark.parametrize("wbits", (zlib.MAX_WBITS, -zlib.MAX_WBITS))
+def test_deflate_streaming(wbits):
+    body = b"test 123"
+    compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+    compressed_body = compressor.compress(body) + compressor.flush()
+
+    # The first chunk may be too short to check for a zlib header.
+    decoder = DeflateDecoder()
+    assert decoder.decode(b"") == b""
+    data = [decoder.decode(compressed_body[idx : idx + 1]) for idx in range(2)]
+    data.append(decoder.decode(compressed_body[2:]))
+    data.append(decoder.flush())
+    assert b"".join(data) == body
+
+    decoder = DeflateDecoder()
+    assert decoder.decode(compressed_body) + decoder.flush() == body
+
+
+def test_deflate_raw_with_zlib_like_header():
+    # A raw deflate stream whose first two bytes happen to form a valid zlib
+    # header: a non-final stored block of length 1, followed by a final empty
+    # stored block.
+    compressed_body = b"\x78\x01\x00\xfe\xff" + b"a" + b"\x01\x00\x00\xff\xff"
+
+    decoder = DeflateDecoder()
+    assert decoder.decode(compressed_body) + decoder.flush() == b"a"
+
+
 def test_gzip():
     body = b"test 123"
     compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
@@ -78,6 +112,21 @@ def test_brotli():
     assert response.content == body
 
 
+def test_brotli_truncated():
+    body = bytes(range(256)) * 47
+    compressed_body = brotli.compress(body)[:-5]
+
+    decoder = BrotliDecoder()
+    decoder.decode(compressed_body)
+    with pytest.raises(ValueError):
+        decoder.flush()
+
+    headers = [(b"Content-Encoding", b"br")]
+    with pytest.raises(httpx.DecodingError):
+        request = httpx.Request("GET", "https://example.org")
+        httpx.Response(200, headers=headers, content=compressed_body, request=request)
+
+
 def test_multi():
     body = b"test 123"
 
@@ -159,6 +208,13 @@ def test_decoders_empty_cases(decoder):
     assert instance.flush() == b""
 
 
+def test_gzip_decoder_allocates_lazily():
+    decoder = GZipDecoder()
+    assert decoder.decode(b"") == b""
+    assert decoder.flush() == b""
+    assert decoder.decompressor is None
+
+
 @pytest.mark.parametrize("header_value", (b"deflate", b"gzip", b"br"))
 def test_decoding_errors(header_value):
     headers = [(b"Content-Encoding", header_value)]
@@ -177,6 +233,13 @@ def test_decoding_errors(header_value):
     [
         ((b"Hello,", b" world!"), "ascii"),
         ((b"\xe3\x83", b"\x88\xe3\x83\xa9", b"\xe3", b"\x83\x99\xe3\x83\xab"), "utf-8"),
+        (
+            (b"\xe3\x83", b"\x88\xe3\x83\xa9", b"\xe3", b"\x83\x99\xe3\x83\xab") * 600,
+            "utf-8",
+        ),
+        ((b"Hello, ",) + (b"\x83g\x83\x89\x83x\x83\x8b",) * 600, "shift-jis"),
+        ((b"\xef\xbb", b"\xbfhello world"), "utf-8-sig"),
+        ((b"\xef\xbb\xbfhello world",) * 600, "utf-8-sig"),
         ((b"\x83g\x83\x89\x83x\x83\x8b",) * 64, "shift-jis"),
         ((b"\x83g\x83\x89\x83x\x83\x8b",) * 600, "shift-jis"),
         (
@@ -190,7 +253,9 @@ def test_decoding_errors(header_value):
     ],
 )
 @pytest.mark.asyncio
-async def test_text_decoder(data, encoding):
+async def test_text_decoder(request, encoding_detector, data, encoding):
+    xfail_if_misdetected(request, encoding_detector, encoding)
+
     async def iterator():
         nonlocal data
         for chunk in data:
@@ -230,6 +295,75 @@ async def test_text_decoder_known_encoding():
     assert "".join(response.text) == "トラベル"
 
 
+@pytest.fixture(params=["cchardet", "charset_normalizer"])
+def fake_fast_detector(request, monkeypatch):
+    """
+    Install a fake `cchardet` or `charset_normalizer` that always reports
+    Shift JIS, and yield the list of contents it was called with.
+    """
+    calls = []
+
+    def detect(content):
+        calls.append(content)
+        return {"encoding": "shift-jis", "confidence": 0.99}
+
+    monkeypatch.setattr("httpx._decoders.cchardet", None)
+    monkeypatch.setattr("httpx._decoders.charset_normalizer", None)
+    fake_module = types.SimpleNamespace(detect=detect)
+    monkeypatch.setattr(f"httpx._decoders.{request.param}", fake_module)
+    yield calls
+
+
+def test_text_decoder_fast_detectors(fake_fast_detector):
+    calls = fake_fast_detector
+
+    decoder = TextDecoder()
+    assert decoder.detector is None
+    assert decoder.decode(b"\x83g\x83\x89") == ""
+    assert decoder.decode(b"\x83x\x83\x8b") == ""
+    assert decoder.flush() == "トラベル"
+    assert calls == [b"\x83g\x83\x89\x83x\x83\x8b"]
+
+    # Detection runs once, over the whole buffer, when it is full.
+    calls.clear()
+    decoder = TextDecoder()
+    text = "".join(decoder.decode(b"\x83g\x83\x89\x83x\x83\x8b") for _ in range(512))
+    assert text == "トラベル" * 512
+    assert len(calls) == 1 and len(calls[0]) == 4096
+
+
+@pytest.mark.usefixtures("encoding_detector")
+def test_detect_encoding():
+    content = "Привет, мир! Как у тебя дела?".encode("utf-8") * 8
+    encoding = detect_encoding(content)
+    assert encoding is not None
+    assert encoding.lower() in ("utf-8", "utf_8")
+
+
+def test_detect_encoding_prefers_fast_detectors(fake_fast_detector):
+    assert detect_encoding(b"\x83g\x83\x89") == "shift-jis"
+    assert fake_fast_detector == [b"\x83g\x83\x89"]
+
+
+@pytest.mark.usefixtures("chardet_only")
+def test_text_decoder_commits_once_detection_is_done():
+    decoder = TextDecoder()
+    assert decoder.decode(b"\xff\xfeH\x00i\x00") == "Hi"
+    assert decoder.buffer is None
+    assert decoder.decode(b"!\x00") == "!"
+    assert decoder.flush() == ""
+
+
+@pytest.mark.usefixtures("chardet_only")
+def test_text_decoder_incomplete_utf8_falls_back_to_detection():
+    # Valid UTF-8 up until the end of the content, where the final byte is
+    # an incomplete multi-byte sequence.
+    decoder = TextDecoder()
+    assert decoder.decode(b"Hello, caf\xe9") == ""
+    assert decoder.flush() == "Hello, caf\xe9"
+
+
+@pytest.mark.usefixtures("encoding_detector")
 def test_text_decoder_empty_cases():
     decoder = TextDecoder()
     assert decoder.flush() == ""
@@ -308,6 +442,25 @@ def test_line_decoder_crnl():
     assert decoder.flush() == []
 
 
+def test_line_decoder_other_separators():
+    # Only '\n', '\r' and '\r\n' are treated as line endings.
+    decoder = LineDecoder()
+    assert decoder.decode("a\x0cb\u2028c\nd\x85") == ["a\x0cb\u2028c\n"]
+    assert decoder.decode("e\r") == []
+    assert decoder.flush() == ["d\x85e\n"]
+
+
+def test_build_decoder():
+    assert build_decoder([]) is _IDENTITY_DECODER
+    assert build_decoder(["", "identity", "invalid-header"]) is _IDENTITY_DECODER
+    assert isinstance(build_decoder(["identity", "gzip"]), GZipDecoder)
+
+    decoder = build_decoder(["deflate", "identity", "gzip"])
+    assert isinstance(decoder, MultiDecoder)
+    assert isinstance(decoder.children, tuple)
+    assert [type(child) for child in decoder.children] == [GZipDecoder, DeflateDecoder]
+
+
 def test_invalid_content_encoding_header():
     headers = [(b"Content-Encoding", b"invalid-header")]
     body = b"test 123"
@@ -1,13 +1,27 @@
 import contextlib
 import logging
 import os
-from typing import Callable, List, Mapping, Optional, Tuple
+from typing import Any, Callable, List, Mapping, Optional, Tuple
 
 import httpcore
+import pytest
 
 import httpx
 from httpx import _utils
 
+# Samples from the test suite that a given detector attributes to some other
+# encoding, keyed by (detector, actual encoding).
+MISDETECTED = {
+    ("charset_normalizer", "MacCyrillic"),  # Read as Hebrew, windows-1255.
+    ("charset_normalizer", "EUC-JP"),  # Read as Korean, CP949.
+}
+
+
+def xfail_if_misdetected(request: Any, detector: str, encoding: str) -> None:
+    if (detector, encoding) in MISDETECTED:
+        reason = f"{detector} does not detect this {encoding} sample"
+        request.node.add_marker(pytest.mark.xfail(reason=reason, strict=True))
+
 
 @contextlib.contextmanager
 def override_log_level(log_level: str):